@@ -1,15 +1,52 @@
 import json
 import os
+import re
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
 
 import openai
 import streamlit as st
 from dotenv import load_dotenv
 
 from fpl_data import fetch_squad_analysis_data
+from report import REPORT_SCHEMA, STRUCTURED_OUTPUT_PROMPT, render_report_markdown
 
 load_dotenv()
 
+# Sectioned mode: (job key, report sections it writes, max completion tokens).
+# Chip choice, captaincy, transfers/hits, squad, XI, risks and the summary
+# table all depend on each other, so they stay in one "squad_plan" completion
+# to keep the report consistent; only the injury report and contingency
+# plan run alongside it. The trade-off is less parallelism: wall-clock time
+# is roughly the squad_plan completion, and contingency pivots are written
+# without seeing the final transfers.
+SECTION_JOBS: List[Tuple[str, Tuple[int, ...], int]] = [
+    ("injuries", (2,), 600),
+    ("squad_plan", (1, 3, 4, 5, 6, 7, 8), 3500),
+    ("contingency", (9,), 600),
+]
+
+# Section requests in flight across ALL concurrent analyses in this process
+MAX_SECTION_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "6"))
+_section_pool = ThreadPoolExecutor(
+    max_workers=max(1, MAX_SECTION_CONCURRENCY), thread_name_prefix="fpl-section"
+)
+
+# Per-job model overrides applied when none are passed (empty: use the
+# selected model everywhere). Callers can route simple jobs such as
+# "injuries" to a cheaper model via section_models.
+DEFAULT_SECTION_MODELS: Dict[str, str] = {}
+
+# Reasoning models (o-series, gpt-5/-mini/-nano) reject a custom temperature
+# and spend completion tokens on hidden reasoning before writing output
+REASONING_MODEL_PATTERN = re.compile(r"^(o\d|gpt-5(-|$))")
+REASONING_TOKEN_HEADROOM = 4000
+
+
+class SectionIncomplete(Exception):
+    """A section completion came back empty or cut off."""
+
 
 def get_openai_client() -> openai.OpenAI:
     """Initialize OpenAI client from .env or Streamlit secrets."""
@@ -19,22 +56,17 @@ def get_openai_client() -> openai.OpenAI:
     return openai.OpenAI(api_key=api_key)
 
 
-def generate_squad_recommendation(
-    team_id: int, model: str = "gpt-5.2"
-) -> tuple[str, int]:
+def build_analysis_context(data: Dict[str, Any]) -> Dict[str, Any]:
     """
-    Fetch FPL data and use GPT-5 to generate squad recommendations.
+    Pre-process raw FPL data into the compact values shared by every prompt.
 
     Args:
-        team_id: FPL manager team ID
-        model: OpenAI model to use
+        data: Output of fetch_squad_analysis_data
 
     Returns:
-        Tuple of (GPT-generated recommendations as markdown string, next gameweek number)
+        Dict of compact JSON strings for the prompt plus the lookups needed to
+        validate and render a structured report locally
     """
-    data = fetch_squad_analysis_data(team_id)
-    client = get_openai_client()
-
     # Ultra-minimal data for low token limits
     bootstrap = data["bootstrap"]
     elements = bootstrap["elements"]
@@ -310,7 +342,45 @@ def generate_squad_recommendation(
         else "None"
     )
 
-    prompt = f"""You are an elite Fantasy Premier League decision engine.
+    # Lightweight lookup so structured reports can be checked and rendered
+    # locally without sending the full element list back to the model
+    players = {
+        el["id"]: {
+            "name": el["web_name"],
+            "team": team_map[el["team_code"]],
+            "pos": ["GK", "DEF", "MID", "FWD"][el["element_type"] - 1],
+            "cost": el["now_cost"] / 10,
+            "chance": el.get("chance_of_playing_next_round"),
+            "news": el.get("news", ""),
+        }
+        for el in elements
+    }
+
+    return {
+        "current_gw": data["current_gw"],
+        "next_gw": data["next_gw"],
+        "free_transfers": free_transfers,
+        "bank": round(bank, 1),
+        "chips_str": chips_str,
+        "dgw_bgw_str": dgw_bgw_str,
+        "team_str": team_str,
+        "current_players_str": current_players_str,
+        "injured_str": injured_str,
+        "fixtures_sum_str": fixtures_sum_str,
+        "top_players_str": top_players_str,
+        "remaining_chips": remaining_chips,
+        "schedule_notes": schedule_notes,
+        "squad_ids": squad_ids,
+        "injured_ids": [p["id"] for p in injured_players],
+        "players": players,
+    }
+
+
+def _rules_prompt(ctx: Dict[str, Any]) -> str:
+    """Decision rules shared by every output mode."""
+    free_transfers = ctx["free_transfers"]
+    chips_str = ctx["chips_str"]
+    return f"""You are an elite Fantasy Premier League decision engine.
 
 ### PRIMARY OBJECTIVE:
 Maximize expected total points over the next gameweek.
@@ -421,7 +491,14 @@ You have these chips remaining: {chips_str}.
 - If Free Hit is available, save for blank gameweeks or massive DGWs.
 Explicitly recommend ONE strategy: "Save Chips" or "Play [Chip Name]".
 
-### OUTPUT (STRICT MARKDOWN)
+"""
+
+
+def _markdown_output_prompt(ctx: Dict[str, Any]) -> str:
+    """Instructions for the full 9-section markdown report."""
+    chips_str = ctx["chips_str"]
+    dgw_bgw_str = ctx["dgw_bgw_str"]
+    return f"""### OUTPUT (STRICT MARKDOWN)
 
 ---
 
@@ -496,22 +573,242 @@ If a recommended player is benched or injured pre-deadline, provide emergency pi
 
 ---
 
-### DATA PROVIDED
-- Current GW: {data["current_gw"]}
-- Next GW: {data["next_gw"]}
-- Team Info: {team_str}
-- Current Squad: {current_players_str}
-- Injured/Flagged Players: {injured_str}
-- Next 5 Fixtures by Team: {fixtures_sum_str}
-- DGW/BGW Alerts: {dgw_bgw_str}
-- Remaining Chips: {chips_str}
-- Top Replacement Options by Position: {top_players_str}
+"""
+
+
+def _data_prompt(ctx: Dict[str, Any]) -> str:
+    """Compact data block appended to every prompt."""
+    return f"""### DATA PROVIDED
+- Current GW: {ctx["current_gw"]}
+- Next GW: {ctx["next_gw"]}
+- Team Info: {ctx["team_str"]}
+- Current Squad: {ctx["current_players_str"]}
+- Injured/Flagged Players: {ctx["injured_str"]}
+- Next 5 Fixtures by Team: {ctx["fixtures_sum_str"]}
+- DGW/BGW Alerts: {ctx["dgw_bgw_str"]}
+- Remaining Chips: {ctx["chips_str"]}
+- Top Replacement Options by Position: {ctx["top_players_str"]}
 
 Fixture difficulty: 1=easiest, 5=hardest. Prefer lower difficulty and home games.
 
 Make firm decisions. Avoid hedging language. If options are close, explain why.
 """
 
+
+def _completion_params(model: str, max_tokens: int) -> Dict[str, Any]:
+    """Sampling/limit kwargs for chat completions, adjusted for reasoning models."""
+    if REASONING_MODEL_PATTERN.match(model):
+        return {"max_completion_tokens": max_tokens + REASONING_TOKEN_HEADROOM}
+    return {"max_completion_tokens": max_tokens, "temperature": 0.3}
+
+
+def generate_structured_report(
+    client: openai.OpenAI, ctx: Dict[str, Any], model: str = "gpt-5.2"
+) -> Dict[str, Any]:
+    """
+    Ask the model for a JSON report matching REPORT_SCHEMA.
+
+    Args:
+        client: OpenAI client
+        ctx: Output of build_analysis_context
+        model: OpenAI model to use
+
+    Returns:
+        Parsed report dict
+    """
+    prompt = _rules_prompt(ctx) + STRUCTURED_OUTPUT_PROMPT + _data_prompt(ctx)
+
+    response = client.chat.completions.create(
+        model=model,
+        messages=[{"role": "user", "content": prompt}],
+        # Only tokens actually generated are billed/waited on; the headroom
+        # covers squads with many flagged players and long reason fields
+        **_completion_params(model, 3000),
+        response_format={
+            "type": "json_schema",
+            "json_schema": {
+                "name": "fpl_report",
+                "strict": True,
+                "schema": REPORT_SCHEMA,
+            },
+        },
+    )
+
+    choice = response.choices[0]
+    refusal = getattr(choice.message, "refusal", None)
+    if refusal:
+        raise ValueError(f"Model refused to produce a report: {refusal}")
+    if choice.finish_reason == "length":
+        raise ValueError(
+            "Model report was cut off at the completion token limit; "
+            "try again or use the full report mode"
+        )
+
+    content = choice.message.content
+    try:
+        return json.loads(content)
+    except (TypeError, json.JSONDecodeError) as e:
+        raise ValueError(f"Model returned invalid JSON report: {e}") from e
+
+
+def _markdown_sections(ctx: Dict[str, Any]) -> Dict[int, str]:
+    """Split the markdown output instructions into numbered sections."""
+    blocks = _markdown_output_prompt(ctx).split("\n---\n")
+    return {
+        int(m.group(1)): block.strip()
+        for block in blocks
+        if (m := re.match(r"\s*## (\d+)\.", block))
+    }
+
+
+def _strip_rules(text: str) -> str:
+    """Drop leading/trailing horizontal rules the model adds around a section."""
+    lines = text.strip().splitlines()
+    while lines and lines[0].strip() in ("", "---"):
+        lines.pop(0)
+    while lines and lines[-1].strip() in ("", "---"):
+        lines.pop()
+    return "\n".join(lines)
+
+
+def _complete_section(
+    client: openai.OpenAI,
+    prompt: str,
+    model: str,
+    max_tokens: int,
+    retries: int,
+) -> str:
+    """Run one section completion; the SDK retries transient API errors."""
+    client = client.with_options(max_retries=max(0, retries))
+    response = client.chat.completions.create(
+        model=model,
+        messages=[{"role": "user", "content": prompt}],
+        **_completion_params(model, max_tokens),
+    )
+    choice = response.choices[0]
+    if choice.finish_reason == "length":
+        raise SectionIncomplete("cut off at the completion token limit")
+    content = _strip_rules(choice.message.content or "")
+    if not content:
+        raise SectionIncomplete("model returned no content")
+    return content
+
+
+def _split_sections(text: str) -> Dict[int, str]:
+    """Split a completion into its "## N." sections, keyed by section number."""
+    parts = {}
+    for chunk in re.split(r"(?m)^(?=## \d+\.)", text):
+        m = re.match(r"## (\d+)\.", chunk)
+        if m:
+            parts[int(m.group(1))] = _strip_rules(chunk)
+    return parts
+
+
+def generate_sectioned_report(
+    client: openai.OpenAI,
+    ctx: Dict[str, Any],
+    model: str = "gpt-5.2",
+    section_models: Optional[Dict[str, str]] = None,
+    retries: int = 2,
+) -> str:
+    """
+    Generate the markdown report as independent section completions in parallel.
+
+    Every job prompt shares the same rules + data prefix (so it is
+    prompt-cached after the first request) and ends with its own section
+    instructions. Jobs run on a process-wide pool capped at
+    MAX_SECTION_CONCURRENCY requests, shared by all concurrent analyses.
+
+    Args:
+        client: OpenAI client
+        ctx: Output of build_analysis_context
+        model: OpenAI model for jobs without an override
+        section_models: Per-job model overrides keyed by SECTION_JOBS key
+        retries: Retries per job on transient OpenAI errors (connection,
+            timeout, rate limit, server error)
+
+    Returns:
+        Merged markdown report in the original section order
+    """
+    models = {**DEFAULT_SECTION_MODELS, **(section_models or {})}
+    sections = _markdown_sections(ctx)
+    shared = _rules_prompt(ctx) + _data_prompt(ctx)
+
+    def run_job(
+        job: Tuple[str, Tuple[int, ...], int],
+    ) -> Tuple[Optional[Exception], Dict[int, str]]:
+        key, numbers, max_tokens = job
+        prompt = (
+            shared
+            + "\n### OUTPUT (STRICT MARKDOWN)\n\n"
+            + "Write ONLY the following report section(s), in this order, "
+            + "with these exact headings. Nothing before or after.\n\n"
+            + "\n\n---\n\n".join(sections[n] for n in numbers)
+            + "\n"
+        )
+        try:
+            text = _complete_section(
+                client, prompt, models.get(key, model), max_tokens, retries
+            )
+        except (openai.APIError, SectionIncomplete) as e:
+            return e, {}
+        return None, _split_sections(text)
+
+    results = list(_section_pool.map(run_job, SECTION_JOBS))
+    errors = [error for error, _ in results if error]
+    if len(errors) == len(results):
+        raise RuntimeError(f"All report sections failed: {errors[0]}") from errors[0]
+
+    merged: Dict[int, str] = {}
+    for (_, numbers, _), (error, written) in zip(SECTION_JOBS, results):
+        reason = error or "missing from model output"
+        for n in numbers:
+            heading = sections[n].splitlines()[0]
+            merged[n] = written.get(n) or (
+                f"{heading}\n\n_⚠️ Section unavailable: {reason}_"
+            )
+
+    return "---\n\n" + "\n\n---\n\n".join(merged[n] for n in sorted(merged)) + "\n"
+
+
+def generate_squad_recommendation(
+    team_id: int,
+    model: str = "gpt-5.2",
+    structured: bool = False,
+    sectioned: bool = False,
+    section_models: Optional[Dict[str, str]] = None,
+) -> tuple[str, int]:
+    """
+    Fetch FPL data and use GPT-5 to generate squad recommendations.
+
+    Args:
+        team_id: FPL manager team ID
+        model: OpenAI model to use
+        structured: Ask the model for a compact JSON report and render the
+            markdown locally instead of having the model write it
+        sectioned: Generate report sections as parallel completions and merge them
+        section_models: Sectioned mode only, per-job model overrides
+
+    Returns:
+        Tuple of (GPT-generated recommendations as markdown string, next gameweek number)
+    """
+    if structured and sectioned:
+        raise ValueError("Choose either structured or sectioned output, not both")
+
+    data = fetch_squad_analysis_data(team_id)
+    client = get_openai_client()
+    ctx = build_analysis_context(data)
+
+    if structured:
+        report = generate_structured_report(client, ctx, model)
+        return render_report_markdown(report, ctx), data["next_gw"]
+
+    if sectioned:
+        report = generate_sectioned_report(client, ctx, model, section_models)
+        return report, data["next_gw"]
+
+    prompt = _rules_prompt(ctx) + _markdown_output_prompt(ctx) + _data_prompt(ctx)
+
     response = client.chat.completions.create(
         model=model,
         messages=[{"role": "user", "content": prompt}],
@@ -1,9 +1,22 @@
+import os
+
 import streamlit as st
 
-from analyzer import generate_squad_recommendation
+from analyzer import SECTION_JOBS, generate_squad_recommendation
+from prefetch import start_prefetch_scheduler
 
 st.set_page_config(page_title="FPL AI Assistant", page_icon="⚽", layout="wide")
 
+
+@st.cache_resource
+def _prefetch_scheduler():
+    """One background cache warmer per server process, not per rerun."""
+    return start_prefetch_scheduler()
+
+
+if os.getenv("FPL_PREFETCH", "1") != "0":
+    _prefetch_scheduler()
+
 st.markdown(
     """
 <style>
@@ -25,6 +38,26 @@ with st.sidebar:
         help="fantasy.premierleague.com/entry/{ID}",
     )
     model = st.selectbox("GPT Model", ["gpt-5.2", "gpt-5.1"])
+    mode = st.radio(
+        "Output mode",
+        ["Full report", "Structured (faster)", "Parallel sections"],
+        help=(
+            "Structured: model returns compact JSON; report is rendered and "
+            "rule-checked locally. Parallel sections: independent report "
+            "sections are generated concurrently and merged."
+        ),
+    )
+    section_models = {}
+    if mode == "Parallel sections":
+        with st.expander("Per-section models"):
+            for key, _, _ in SECTION_JOBS:
+                choice = st.selectbox(
+                    key.replace("_", " ").title(),
+                    ["Same as GPT Model", "gpt-5.2", "gpt-5.1", "gpt-5-mini"],
+                    key=f"section_model_{key}",
+                )
+                if choice != "Same as GPT Model":
+                    section_models[key] = choice
 
     st.header("📖 Quick Start")
     st.markdown(
@@ -41,7 +74,13 @@ if col1.button(
 ):
     with st.spinner("Fetching FPL data & GPT analysis..."):
         try:
-            recs, gw = generate_squad_recommendation(team_id, model)
+            recs, gw = generate_squad_recommendation(
+                team_id,
+                model,
+                structured=mode == "Structured (faster)",
+                sectioned=mode == "Parallel sections",
+                section_models=section_models,
+            )
             st.session_state.recs = recs
             st.session_state.team_id = team_id
             st.session_state.gw = gw
@@ -1,50 +1,199 @@
-from typing import Any, Dict
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional, Tuple
 
 import requests
 
 BASE_URL = "https://fantasy.premierleague.com/api/"
 
+# Freshness (seconds) for endpoints shared by every manager. The prefetch
+# scheduler stores warmed entries for longer, until its next planned refresh.
+BOOTSTRAP_TTL = 300
+FIXTURES_TTL = 1800
+PLAYER_HISTORY_TTL = 1800
 
-def get_bootstrap() -> Dict[str, Any]:
-    """Fetch bootstrap-static data with players, teams, events."""
-    response = requests.get(f"{BASE_URL}bootstrap-static/")
+# Cap on FPL requests per process, shared by analyses and prefetching.
+# Background requests must leave PREFETCH_RESERVE of it for users; user
+# requests wait up to USER_BUDGET_WAIT seconds for a slot before failing.
+MAX_REQUESTS_PER_HOUR = int(os.getenv("FPL_REQUESTS_PER_HOUR", "600"))
+PREFETCH_RESERVE = 0.25
+USER_BUDGET_WAIT = 30
+
+# Optional directory so the cache can be shared with a standalone prefetch daemon
+CACHE_DIR = os.getenv("FPL_CACHE_DIR")
+
+_cache: Dict[str, Tuple[float, Any]] = {}
+_cache_lock = threading.Lock()
+
+
+class RequestBudgetExceeded(RuntimeError):
+    """Raised when the hourly FPL request budget is spent."""
+
+
+class RequestBudget:
+    """
+    Sliding one-hour window capping how many FPL requests this process makes.
+
+    The counter is in-memory, so a standalone prefetch daemon and the app
+    each get their own budget.
+    """
+
+    def __init__(self, max_requests: int = MAX_REQUESTS_PER_HOUR, window: float = 3600):
+        self.max_requests = max_requests
+        self.window = window
+        self._sent: deque = deque()
+        self._lock = threading.Lock()
+
+    def _try_acquire(self, limit: int) -> float:
+        """Reserve a slot under limit; 0 on success, else seconds until one frees."""
+        now = time.monotonic()
+        with self._lock:
+            while self._sent and now - self._sent[0] >= self.window:
+                self._sent.popleft()
+            if len(self._sent) < limit:
+                self._sent.append(now)
+                return 0
+            if limit <= 0:
+                return self.window
+            # Oldest request that must expire before we fit under the limit
+            return self.window - (now - self._sent[len(self._sent) - limit])
+
+    def acquire(self, background: bool = False) -> None:
+        """
+        Reserve one request.
+
+        Args:
+            background: Prefetch request; only allowed while the user reserve
+                is untouched, and dropped rather than delayed
+
+        Raises:
+            RequestBudgetExceeded: If no slot frees up in time
+        """
+        if background:
+            limit = int(self.max_requests * (1 - PREFETCH_RESERVE))
+            retry_after = self._try_acquire(limit)
+        else:
+            deadline = time.monotonic() + USER_BUDGET_WAIT
+            while True:
+                retry_after = self._try_acquire(self.max_requests)
+                remaining = deadline - time.monotonic()
+                if not retry_after or retry_after > remaining:
+                    break
+                time.sleep(retry_after)
+        if retry_after:
+            raise RequestBudgetExceeded(
+                f"FPL request budget exhausted, try again in {retry_after:.0f}s"
+            )
+
+
+REQUEST_BUDGET = RequestBudget()
+
+
+def _request(path: str, background: bool = False) -> Any:
+    """GET an FPL endpoint within the global request budget."""
+    REQUEST_BUDGET.acquire(background)
+    response = requests.get(f"{BASE_URL}{path}")
     response.raise_for_status()
     return response.json()
 
 
-def get_fixtures(event: int) -> list:
+def _cache_file(path: str) -> Optional[str]:
+    if not CACHE_DIR:
+        return None
+    return os.path.join(CACHE_DIR, re.sub(r"[^A-Za-z0-9]+", "_", path) + ".json")
+
+
+def _read_cache(path: str) -> Optional[Tuple[float, Any]]:
+    with _cache_lock:
+        entry = _cache.get(path)
+    # A stale in-memory entry may have been refreshed on disk by another process
+    if (entry and entry[0] > time.time()) or not CACHE_DIR:
+        return entry
+    try:
+        with open(_cache_file(path), encoding="utf-8") as f:
+            stored = json.load(f)
+        entry = (stored["expires"], stored["data"])
+    except (OSError, ValueError, KeyError):
+        return None
+    with _cache_lock:
+        _cache[path] = entry
+    return entry
+
+
+def _write_cache(path: str, expires: float, payload: Any) -> None:
+    with _cache_lock:
+        _cache[path] = (expires, payload)
+    if not CACHE_DIR:
+        return
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        target = _cache_file(path)
+        tmp = f"{target}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"expires": expires, "data": payload}, f)
+        os.replace(tmp, target)
+    except OSError:
+        pass  # Disk cache is best-effort; the in-memory entry is still valid
+
+
+def _get_json(
+    path: str, ttl: float, refresh: bool = False, background: bool = False
+) -> Any:
+    """GET an FPL endpoint, serving from cache while the entry is fresh."""
+    if not refresh:
+        entry = _read_cache(path)
+        if entry and entry[0] > time.time():
+            return entry[1]
+
+    payload = _request(path, background)
+    _write_cache(path, time.time() + ttl, payload)
+    return payload
+
+
+def get_bootstrap(
+    ttl: float = BOOTSTRAP_TTL, refresh: bool = False, background: bool = False
+) -> Dict[str, Any]:
+    """Fetch bootstrap-static data with players, teams, events."""
+    return _get_json("bootstrap-static/", ttl, refresh, background)
+
+
+def store_bootstrap(bootstrap: Dict[str, Any], ttl: float) -> None:
+    """Re-cache an already fetched bootstrap payload with a new TTL."""
+    _write_cache("bootstrap-static/", time.time() + ttl, bootstrap)
+
+
+def get_fixtures(
+    event: int,
+    ttl: float = FIXTURES_TTL,
+    refresh: bool = False,
+    background: bool = False,
+) -> list:
     """Fetch fixtures for a specific gameweek."""
-    response = requests.get(f"{BASE_URL}fixtures/?event={event}")
-    response.raise_for_status()
-    return response.json()
+    return _get_json(f"fixtures/?event={event}", ttl, refresh, background)
 
 
 def get_user_team(team_id: int) -> Dict[str, Any]:
     """Fetch user team data."""
-    response = requests.get(f"{BASE_URL}entry/{team_id}/")
-    response.raise_for_status()
-    return response.json()
+    return _request(f"entry/{team_id}/")
 
 
 def get_user_history(team_id: int) -> Dict[str, Any]:
     """Fetch user history including chip usage."""
-    response = requests.get(f"{BASE_URL}entry/{team_id}/history/")
-    response.raise_for_status()
-    return response.json()
+    return _request(f"entry/{team_id}/history/")
 
 
 def get_player_history(player_id: int) -> Dict[str, Any]:
     """Fetch detailed player history and summaries."""
-    response = requests.get(f"{BASE_URL}element-summary/{player_id}/")
-    response.raise_for_status()
-    return response.json()
+    return _get_json(f"element-summary/{player_id}/", PLAYER_HISTORY_TTL)
 
 
 def get_user_picks(team_id: int, event: int) -> Dict[str, Any]:
     """Fetch user current picks/squad for a gameweek."""
-    response = requests.get(f"{BASE_URL}entry/{team_id}/event/{event}/picks/")
-    response.raise_for_status()
-    return response.json()
+    return _request(f"entry/{team_id}/event/{event}/picks/")
 
 
 def get_next_gameweek(bootstrap: Dict[str, Any]) -> int:
@@ -76,6 +225,8 @@ def fetch_squad_analysis_data(team_id: int) -> Dict[str, Any]:
         try:
             gw_fixtures = get_fixtures(gw)
             all_fixtures.extend(gw_fixtures)
+        except RequestBudgetExceeded:
+            raise
         except Exception:
             break  # Stop if no more fixtures available
 
@@ -95,6 +246,8 @@ def fetch_squad_analysis_data(team_id: int) -> Dict[str, Any]:
             player_summary = get_player_history(player_id)
             # Last 5 games only to save tokens/processing
             squad_history[player_id] = player_summary.get("history", [])[-5:]
+        except RequestBudgetExceeded:
+            raise
         except Exception:
             squad_history[player_id] = []
 
@@ -0,0 +1,162 @@
+import logging
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from fpl_data import get_bootstrap, get_fixtures, get_next_gameweek, store_bootstrap
+
+logger = logging.getLogger(__name__)
+
+# Refresh intervals (seconds) per phase of the gameweek cycle
+LIVE_INTERVAL = 120  # Matches in progress
+DEADLINE_CLOSE_INTERVAL = 300  # Deadline within DEADLINE_CLOSE_WINDOW
+DEADLINE_NEAR_INTERVAL = 1800  # Deadline within DEADLINE_NEAR_WINDOW
+QUIET_INTERVAL = 6 * 3600  # Between gameweeks
+
+DEADLINE_CLOSE_WINDOW = 2 * 3600
+DEADLINE_NEAR_WINDOW = 24 * 3600
+
+JITTER = 0.15  # +/- fraction applied to every interval
+
+
+def _parse_deadline(event: Dict[str, Any]) -> Optional[datetime]:
+    deadline = event.get("deadline_time")
+    if not deadline:
+        return None
+    try:
+        return datetime.fromisoformat(deadline.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+
+def plan_refresh(
+    events: List[Dict[str, Any]], now: Optional[datetime] = None
+) -> Tuple[str, float]:
+    """
+    Decide how urgently the FPL caches need refreshing.
+
+    Args:
+        events: bootstrap["events"]
+        now: Current UTC time (defaults to now)
+
+    Returns:
+        Tuple of (phase name, seconds until the next refresh)
+    """
+    now = now or datetime.now(timezone.utc)
+
+    # Deadline passed but the gameweek is not finished -> matches are being played
+    for event in events:
+        deadline = _parse_deadline(event)
+        if deadline and deadline <= now and not event.get("finished"):
+            return "live", LIVE_INTERVAL
+
+    upcoming = [
+        d
+        for d in (_parse_deadline(e) for e in events if not e.get("finished"))
+        if d and d > now
+    ]
+    if not upcoming:
+        return "quiet", QUIET_INTERVAL
+
+    until_deadline = (min(upcoming) - now).total_seconds()
+    if until_deadline <= DEADLINE_CLOSE_WINDOW:
+        return "deadline", DEADLINE_CLOSE_INTERVAL
+    if until_deadline <= DEADLINE_NEAR_WINDOW:
+        return "pre-deadline", DEADLINE_NEAR_INTERVAL
+    # Wake up in time for the pre-deadline window rather than sleeping through it
+    return "quiet", max(
+        DEADLINE_NEAR_INTERVAL,
+        min(QUIET_INTERVAL, until_deadline - DEADLINE_NEAR_WINDOW),
+    )
+
+
+class PrefetchScheduler(threading.Thread):
+    """
+    Background thread that keeps bootstrap and fixtures warm.
+
+    Refreshes often around deadlines and during matches, rarely in between.
+    Warmed entries stay valid until shortly after the next planned refresh,
+    so analyses in between are served from cache. Between gameweeks that
+    means bootstrap can be up to ~8h old; within 2h of a deadline it is at
+    most ~8 min old. Requests draw on the shared fpl_data budget as
+    background traffic.
+    """
+
+    def __init__(self, jitter: float = JITTER, daemon: bool = True):
+        super().__init__(name="fpl-prefetch", daemon=daemon)
+        self.jitter = jitter
+        # Start at the shortest interval so backoff begins small when the
+        # first refresh fails before the phase is known
+        self._interval: float = LIVE_INTERVAL
+        self._failures = 0
+        self._future_warmed_at: Optional[float] = None
+        self._stop_event = threading.Event()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+    def _ttl(self, interval: float) -> float:
+        # Outlive the (jittered) interval so entries survive until the next pass
+        return interval * (1 + 2 * self.jitter) + 60
+
+    def refresh(self) -> float:
+        """
+        Warm the caches once.
+
+        Returns:
+            Seconds until the next refresh (before jitter)
+        """
+        bootstrap = get_bootstrap(refresh=True, background=True)
+        phase, interval = plan_refresh(bootstrap["events"])
+        ttl = self._ttl(interval)
+        # The phase is only known after fetching, so re-store with its TTL
+        store_bootstrap(bootstrap, ttl)
+        next_gw = get_next_gameweek(bootstrap)
+
+        # During matches this picks up scores and kick-off/finished flags
+        get_fixtures(next_gw, ttl=ttl, refresh=True, background=True)
+
+        # Later GWs of the 5-GW window fetch_squad_analysis_data reads rarely
+        # change, so they are refreshed on the quiet cadence whatever the phase
+        now = time.monotonic()
+        if self._future_warmed_at is None or (
+            now - self._future_warmed_at >= QUIET_INTERVAL
+        ):
+            future_ttl = self._ttl(QUIET_INTERVAL)
+            for gw in range(next_gw + 1, min(next_gw + 5, 39)):
+                get_fixtures(gw, ttl=future_ttl, refresh=True, background=True)
+            self._future_warmed_at = now
+
+        self._interval = interval
+        logger.info("Prefetched FPL data (%s, next in %ds)", phase, interval)
+        return interval
+
+    def run(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                interval = self.refresh()
+                self._failures = 0
+            except Exception as e:
+                # Exponential backoff on FPL errors or a spent budget
+                self._failures += 1
+                interval = min(self._interval * 2**self._failures, QUIET_INTERVAL)
+                logger.warning(
+                    "FPL prefetch failed (%d in a row): %s", self._failures, e
+                )
+            delay = interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+            self._stop_event.wait(delay)
+
+
+def start_prefetch_scheduler(**kwargs) -> PrefetchScheduler:
+    """Start a PrefetchScheduler thread and return it."""
+    scheduler = PrefetchScheduler(**kwargs)
+    scheduler.start()
+    return scheduler
+
+
+if __name__ == "__main__":
+    # Standalone daemon: set FPL_CACHE_DIR to share the warmed cache with the app
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    start_prefetch_scheduler(daemon=False).join()
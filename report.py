@@ -0,0 +1,443 @@
+from collections import Counter
+from typing import Any, Dict, List
+
+# Squad shape enforced by FPL: 2 GK, 5 DEF, 5 MID, 3 FWD, max 3 per club
+SQUAD_SHAPE = {"GK": 2, "DEF": 5, "MID": 5, "FWD": 3}
+MAX_PER_CLUB = 3
+
+# Strategy codes the model may return mapped to FPL API chip names
+CHIP_CODES = {
+    "WILDCARD": "wildcard",
+    "FREE HIT": "freehit",
+    "BB": "bboost",
+    "TC": "3xc",
+}
+
+_PLAYER_ID = {"type": "integer"}
+
+REPORT_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "additionalProperties": False,
+    "required": [
+        "mode",
+        "chip",
+        "injuries",
+        "captains",
+        "aggressiveness",
+        "hit_budget",
+        "flops",
+        "transfers",
+        "formation",
+        "xi",
+        "bench",
+        "risks",
+        "contingency",
+        "outcome",
+    ],
+    "properties": {
+        "mode": {"type": "string", "enum": ["DEFENSIVE", "BALANCED", "AGGRESSIVE"]},
+        "chip": {
+            "type": "object",
+            "additionalProperties": False,
+            "required": ["code", "reason"],
+            "properties": {
+                "code": {
+                    "type": "string",
+                    "enum": ["SAVE", "WILDCARD", "FREE HIT", "TC", "BB"],
+                },
+                "reason": {"type": "string"},
+            },
+        },
+        "injuries": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "additionalProperties": False,
+                "required": ["id", "urgency", "action", "note"],
+                "properties": {
+                    "id": _PLAYER_ID,
+                    "urgency": {
+                        "type": "string",
+                        "enum": ["CRITICAL", "HIGH", "MEDIUM", "LOW"],
+                    },
+                    "action": {"type": "string", "enum": ["SELL", "HOLD", "MONITOR"]},
+                    "note": {"type": "string"},
+                },
+            },
+        },
+        "captains": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "additionalProperties": False,
+                "required": ["id", "reason"],
+                "properties": {"id": _PLAYER_ID, "reason": {"type": "string"}},
+            },
+        },
+        "aggressiveness": {"type": "string", "enum": ["High", "Medium", "Low"]},
+        "hit_budget": {"type": "string"},
+        "flops": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "additionalProperties": False,
+                "required": ["id", "verdict", "reason"],
+                "properties": {
+                    "id": _PLAYER_ID,
+                    "verdict": {"type": "string", "enum": ["SELL", "UNLUCKY - HOLD"]},
+                    "reason": {"type": "string"},
+                },
+            },
+        },
+        "transfers": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "additionalProperties": False,
+                "required": ["out", "in", "gain", "reason"],
+                "properties": {
+                    "out": _PLAYER_ID,
+                    "in": _PLAYER_ID,
+                    "gain": {"type": "number"},
+                    "reason": {"type": "string"},
+                },
+            },
+        },
+        "formation": {"type": "string"},
+        "xi": {"type": "array", "items": _PLAYER_ID},
+        "bench": {"type": "array", "items": _PLAYER_ID},
+        "risks": {"type": "array", "items": {"type": "string"}},
+        "contingency": {"type": "array", "items": {"type": "string"}},
+        "outcome": {"type": "string"},
+    },
+}
+
+STRUCTURED_OUTPUT_PROMPT = """### OUTPUT (STRICT JSON)
+
+Return ONLY a JSON object matching the provided schema. Refer to every player by `id`.
+Keep every text field to one short sentence. Do not write markdown.
+
+- `mode`: strategic posture from rank.
+- `chip`: strategy code and one-sentence reasoning.
+- `injuries`: ALL flagged squad players with urgency and action.
+- `captains`: top 3 captaincy options ranked best first (1st = captain, 2nd = vice).
+- `aggressiveness` / `hit_budget`: transfer posture this week.
+- `flops`: ALL squad players meeting FLOP criteria, sold or held.
+- `transfers`: ordered moves with `out`, `in` and estimated points `gain` (before hit cost).
+- `formation`: e.g. "4-4-2".
+- `xi`: 11 starters from the final squad; `bench`: remaining 4, GK first then auto-sub order.
+- `risks`: key insights and risks (injury impact, fixture swings, rotation, differentials).
+- `contingency`: emergency pivots if a recommended player is benched or injured.
+- `outcome`: expected outcome of the plan.
+
+The final 15 after transfers MUST be 2 GK, 5 DEF, 5 MID, 3 FWD with max 3 per team.
+
+---
+
+"""
+
+
+def final_squad(report: Dict[str, Any], ctx: Dict[str, Any]) -> List[int]:
+    """Apply the report's transfers to the current squad."""
+    squad = list(ctx["squad_ids"])
+    for move in report.get("transfers", []):
+        if move["out"] in squad:
+            squad[squad.index(move["out"])] = move["in"]
+    return squad
+
+
+def validate_report(report: Dict[str, Any], ctx: Dict[str, Any]) -> List[str]:
+    """
+    Check a structured report against FPL squad rules.
+
+    Args:
+        report: Parsed report matching REPORT_SCHEMA
+        ctx: Output of analyzer.build_analysis_context
+
+    Returns:
+        List of human-readable rule violations (empty if the plan is legal)
+    """
+    players = ctx["players"]
+    squad_ids = ctx["squad_ids"]
+    issues = []
+
+    referenced = (
+        [i["id"] for i in report["injuries"]]
+        + [c["id"] for c in report["captains"]]
+        + [f["id"] for f in report["flops"]]
+        + [m["out"] for m in report["transfers"]]
+        + [m["in"] for m in report["transfers"]]
+        + report["xi"]
+        + report["bench"]
+    )
+    unknown = sorted({pid for pid in referenced if pid not in players})
+    if unknown:
+        issues.append(f"Unknown player ids: {unknown}")
+        return issues
+
+    # Every flagged squad player must be covered by the injury report
+    reported = {i["id"] for i in report["injuries"]}
+    missing = [pid for pid in ctx["injured_ids"] if pid not in reported]
+    if missing:
+        issues.append(
+            "Injury report omits flagged players: "
+            + ", ".join(players[pid]["name"] for pid in missing)
+        )
+
+    # Transfers
+    outs = [m["out"] for m in report["transfers"]]
+    ins = [m["in"] for m in report["transfers"]]
+    for pid in outs:
+        if pid not in squad_ids:
+            issues.append(f"Transfer out {players[pid]['name']} is not in the squad")
+    for pid in ins:
+        if pid in squad_ids:
+            issues.append(f"Transfer in {players[pid]['name']} is already in the squad")
+    if len(set(outs)) != len(outs) or len(set(ins)) != len(ins):
+        issues.append("Duplicate player in transfers")
+    for move in report["transfers"]:
+        if players[move["out"]]["pos"] != players[move["in"]]["pos"]:
+            issues.append(
+                f"{players[move['out']]['name']} -> {players[move['in']]['name']} "
+                "swaps position"
+            )
+    if remaining_bank(report, ctx) < 0:
+        issues.append(
+            f"Transfers overspend the bank by £{-remaining_bank(report, ctx):.1f}m"
+        )
+
+    # Final squad shape
+    squad = final_squad(report, ctx)
+    shape = Counter(players[pid]["pos"] for pid in squad)
+    if len(set(squad)) != len(squad):
+        issues.append("Final squad contains the same player twice")
+    elif dict(shape) != SQUAD_SHAPE:
+        issues.append(
+            "Final squad must be 2 GK, 5 DEF, 5 MID, 3 FWD "
+            f"(got {', '.join(f'{shape[p]} {p}' for p in SQUAD_SHAPE)})"
+        )
+    for team, count in Counter(players[pid]["team"] for pid in squad).items():
+        if count > MAX_PER_CLUB:
+            issues.append(f"{count} players from {team} (max {MAX_PER_CLUB})")
+
+    # Starting XI and bench
+    xi, bench = report["xi"], report["bench"]
+    if len(set(xi)) != 11:
+        issues.append(f"Starting XI has {len(set(xi))} players (need 11)")
+    if sorted(xi + bench) != sorted(squad):
+        issues.append("XI and bench do not match the final 15-man squad")
+    if bench and players[bench[0]]["pos"] != "GK":
+        issues.append("Bench must list the goalkeeper first")
+    xi_shape = Counter(players[pid]["pos"] for pid in xi)
+    if (
+        xi_shape["GK"] != 1
+        or xi_shape["DEF"] < 3
+        or xi_shape["MID"] < 2
+        or xi_shape["FWD"] < 1
+    ):
+        issues.append("Illegal formation: need 1 GK, at least 3 DEF, 2 MID and 1 FWD")
+    if report["formation"] != formation_of(xi, players):
+        issues.append(
+            f"Formation {report['formation']} does not match XI "
+            f"({formation_of(xi, players)})"
+        )
+
+    # Captaincy
+    if len(report["captains"]) < 2:
+        issues.append("Need at least a captain and vice-captain")
+    for label, choice in zip(("Captain", "Vice-captain"), report["captains"][:2]):
+        if choice["id"] not in xi:
+            issues.append(f"{label} {players[choice['id']]['name']} is not in the XI")
+
+    # Chips
+    chip = CHIP_CODES.get(report["chip"]["code"])
+    if chip and chip not in ctx["remaining_chips"]:
+        issues.append(f"Chip {report['chip']['code']} is not available")
+
+    return issues
+
+
+def formation_of(xi: List[int], players: Dict[int, Dict[str, Any]]) -> str:
+    """Formation string (DEF-MID-FWD) for a starting XI."""
+    shape = Counter(players[pid]["pos"] for pid in xi if pid in players)
+    return f"{shape['DEF']}-{shape['MID']}-{shape['FWD']}"
+
+
+def hit_cost(report: Dict[str, Any], ctx: Dict[str, Any]) -> int:
+    """Points deducted for transfers beyond the free allowance."""
+    if report["chip"]["code"] in ("WILDCARD", "FREE HIT"):
+        return 0
+    return max(0, len(report["transfers"]) - ctx["free_transfers"]) * 4
+
+
+def remaining_bank(report: Dict[str, Any], ctx: Dict[str, Any]) -> float:
+    """Bank left after transfers, using current prices as sell prices."""
+    players = ctx["players"]
+    net = sum(
+        players[m["in"]]["cost"] - players[m["out"]]["cost"]
+        for m in report["transfers"]
+        if m["in"] in players and m["out"] in players
+    )
+    return round(ctx["bank"] - net, 1)
+
+
+def _row(*cells: Any) -> str:
+    """Markdown table row with model text made safe for table cells."""
+    escaped = (" ".join(str(cell).split()).replace("|", "\\|") for cell in cells)
+    return "| " + " | ".join(escaped) + " |"
+
+
+def render_report_markdown(report: Dict[str, Any], ctx: Dict[str, Any]) -> str:
+    """
+    Render a structured report as the 9-section markdown report.
+
+    Args:
+        report: Parsed report matching REPORT_SCHEMA
+        ctx: Output of analyzer.build_analysis_context
+
+    Returns:
+        Markdown string in the same layout as the model-written report
+    """
+    players = ctx["players"]
+
+    def label(pid: int) -> str:
+        p = players.get(pid)
+        return f"{p['name']} ({p['team']})" if p else f"Unknown #{pid}"
+
+    issues = validate_report(report, ctx)
+    valid_ids = not any(i.startswith("Unknown player ids") for i in issues)
+    squad = final_squad(report, ctx)
+    captain = report["captains"][0]["id"] if report["captains"] else None
+    vice = report["captains"][1]["id"] if len(report["captains"]) > 1 else None
+    hits = hit_cost(report, ctx)
+    formation = (
+        formation_of(report["xi"], players) if valid_ids else report["formation"]
+    )
+
+    lines = ["---", "", "## 1. Chip Strategy & Schedule"]
+    lines.append(f"- **Remaining Chips**: {ctx['chips_str']}")
+    if ctx["schedule_notes"]:
+        lines.append("- **Double/Blank GW Alerts**:")
+        lines.extend(f"  - {note}" for note in ctx["schedule_notes"])
+    else:
+        lines.append("- **Double/Blank GW Alerts**: None")
+    lines.append(f"- **Strategy Code**: {report['chip']['code']}")
+    lines.append(f"- **Reasoning**: {report['chip']['reason']}")
+
+    lines += ["", "---", "", "## 2. Injury & Availability Report", ""]
+    if report["injuries"]:
+        for inj in report["injuries"]:
+            p = players.get(inj["id"], {})
+            chance = p.get("chance")
+            chance_str = f"{chance}% chance" if chance is not None else "chance unknown"
+            news = p.get("news") or "No news"
+            lines.append(
+                f"- **{label(inj['id'])}**: {chance_str}. News: {news}. "
+                f"**URGENCY: {inj['urgency']}** ({inj['action']}). {inj['note']}"
+            )
+    else:
+        lines.append("- No flagged players.")
+
+    lines += ["", "---", "", "## 3. Captaincy Outlook (Next 3 GWs)", ""]
+    for rank, choice in enumerate(report["captains"], 1):
+        tag = {1: " (C)", 2: " (VC)"}.get(rank, "")
+        lines.append(f"{rank}. **{label(choice['id'])}**{tag}: {choice['reason']}")
+
+    lines += ["", "---", "", "## 4. Transfer Recommendations", ""]
+    lines.append(f"**Mode**: {report['mode']}")
+    lines.append(f"**Aggressiveness Level**: {report['aggressiveness']}")
+    lines.append(f"**Hit Budget**: {report['hit_budget']}")
+    lines.append("")
+    if report["transfers"]:
+        lines.append("| OUT | IN | Net Cost | Est. Gain |")
+        lines.append("| --- | --- | --- | --- |")
+        for move in report["transfers"]:
+            out_p, in_p = players.get(move["out"]), players.get(move["in"])
+            net = f"£{in_p['cost'] - out_p['cost']:+.1f}m" if out_p and in_p else "?"
+            lines.append(
+                _row(label(move["out"]), label(move["in"]), net, f"{move['gain']:+.1f}")
+            )
+        lines.append("")
+        lines.extend(
+            f"- **{label(m['out'])} → {label(m['in'])}**: {m['reason']}"
+            for m in report["transfers"]
+        )
+        lines.append("")
+        lines.append(
+            f"**Hit Cost**: {-hits} | **Estimated Gain**: "
+            f"{sum(m['gain'] for m in report['transfers']):+.1f} | "
+            f"**Bank After**: £{remaining_bank(report, ctx):.1f}m"
+        )
+    else:
+        lines.append("- No transfers. Roll the free transfer.")
+    if report["flops"]:
+        lines += ["", "**Flops**:"]
+        lines.extend(
+            f"- {label(f['id'])}: {f['verdict']} – {f['reason']}"
+            for f in report["flops"]
+        )
+
+    lines += ["", "---", "", "## 5. Optimized 15-Man Squad", ""]
+    lines.append("| Pos | Player | Team | Cost | Role |")
+    lines.append("| --- | --- | --- | --- | --- |")
+    order = list(SQUAD_SHAPE)
+    for pid in sorted(
+        squad,
+        key=lambda i: order.index(players[i]["pos"]) if i in players else len(order),
+    ):
+        p = players.get(pid, {"name": f"#{pid}", "team": "?", "pos": "?", "cost": 0})
+        role = "XI" if pid in report["xi"] else "Bench"
+        if pid == captain:
+            role += " (C)"
+        elif pid == vice:
+            role += " (VC)"
+        lines.append(_row(p["pos"], p["name"], p["team"], f"£{p['cost']:.1f}m", role))
+
+    lines += ["", "---", "", "## 6. Best Starting XI & Formation", ""]
+    lines.append(f"**Formation**: {formation}")
+    lines.append("")
+    for pos in order:
+        names = [
+            label(pid) for pid in report["xi"] if players.get(pid, {}).get("pos") == pos
+        ]
+        if names:
+            lines.append(f"- **{pos}**: {', '.join(names)}")
+    lines.append("")
+    lines.append("**Bench**:")
+    lines.extend(f"{i}. {label(pid)}" for i, pid in enumerate(report["bench"], 1))
+
+    lines += ["", "---", "", "## 7. Key Insights & Risks", ""]
+    lines.extend(f"- {risk}" for risk in report["risks"])
+
+    lines += ["", "---", "", "## 8. Final Decision Summary", ""]
+    transfers_str = (
+        ", ".join(
+            f"{players.get(m['out'], {}).get('name', '?')} → "
+            f"{players.get(m['in'], {}).get('name', '?')}"
+            for m in report["transfers"]
+        )
+        or "None"
+    )
+    lines.append(
+        "| Transfers | Hits | Captain | Formation | Key Risk | Expected Outcome |"
+    )
+    lines.append("| --- | --- | --- | --- | --- | --- |")
+    lines.append(
+        _row(
+            transfers_str,
+            -hits,
+            players.get(captain, {}).get("name", "?"),
+            formation,
+            report["risks"][0] if report["risks"] else "None",
+            report["outcome"],
+        )
+    )
+
+    lines += ["", "---", "", "## 9. Contingency Plan", ""]
+    lines.extend(f"- {plan}" for plan in report["contingency"])
+
+    if issues:
+        lines += ["", "---", "", "## ⚠️ Rule Check", ""]
+        lines.extend(f"- {issue}" for issue in issues)
+
+    return "\n".join(lines) + "\n"